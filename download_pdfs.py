@@ -1,12 +1,17 @@
 import arxiv
 import os
 import fitz  # PyMuPDF
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from datetime import datetime
-import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 import csv
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import aiohttp
+import aiofiles
+from aiolimiter import AsyncLimiter
 from tqdm import tqdm
 
 # ======================
@@ -16,7 +21,14 @@ BASE_DIR = "./arxiv_analysis"
 PDF_DIR = os.path.join(BASE_DIR, "pdfs")
 TEXT_DIR = os.path.join(BASE_DIR, "texts")
 METADATA_PATH = os.path.join(BASE_DIR, "metadata.csv")
+METADATA_PARQUET_PATH = os.path.join(BASE_DIR, "metadata.parquet")
 EDA_DIR = os.path.join(BASE_DIR, "eda_plots")
+METADATA_COLUMNS = [
+    'arxiv_id', 'title', 'authors', 'published_date', 'category',
+    'pdf_path', 'text_path', 'word_count', 'abstract', 'version'
+]
+EDA_COLUMNS = [c for c in METADATA_COLUMNS if c != 'abstract']
+METADATA_BATCH_SIZE = 50    # Rows buffered before appending to the CSV
 CURRENT_YEAR = datetime.now().year
 
 # Category distribution (last 5 years)
@@ -28,6 +40,20 @@ CATEGORIES = {
     'q-bio.QM': 200,    # Quantitative Biology
     'cs.CV': 500        # Computer Vision
 }
+MAX_RESULTS_FACTOR = 3  # Search results read per category, as a multiple of its target
+
+# Download throttling (arXiv asks clients to be gentle). The rate is shared by all
+# categories and matches the original serial loop's 1.2 s between papers, so
+# concurrency only hides download latency instead of raising the request rate.
+MAX_CONCURRENCY = 16    # Concurrent PDF downloads per host
+RATE_LIMIT = 1          # PDF requests allowed per RATE_PERIOD
+RATE_PERIOD = 1.2       # Seconds
+MAX_RETRIES = 5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+DOWNLOAD_CHUNK_SIZE = 1 << 16
+# arXiv API search requests, shared by all categories (arXiv asks for one every 3 s)
+API_RATE_LIMIT = 1      # Result pages requested per API_RATE_PERIOD
+API_RATE_PERIOD = 3.5   # Seconds
 
 # ======================
 # Setup Functions
@@ -41,114 +67,261 @@ def init_metadata():
     if not os.path.exists(METADATA_PATH):
         with open(METADATA_PATH, 'w', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
-            writer.writerow([
-                'arxiv_id', 'title', 'authors', 'published_date', 'category',
-                'pdf_path', 'text_path', 'word_count', 'abstract', 'version'
-            ])
+            writer.writerow(METADATA_COLUMNS)
+
+def flush_metadata(batch):
+    """Append buffered metadata rows to the CSV and clear the buffer"""
+    if batch:
+        table = pa.Table.from_pylist([dict(zip(METADATA_COLUMNS, row)) for row in batch])
+        with open(METADATA_PATH, 'ab', buffering=1 << 20) as f:
+            pa_csv.write_csv(table, f, write_options=pa_csv.WriteOptions(include_header=False))
+        batch.clear()
+
+def export_metadata_parquet():
+    """Mirror the metadata CSV to a zstd-compressed Parquet file for fast EDA reads"""
+    # Titles and abstracts may contain quoted newlines
+    table = pa_csv.read_csv(METADATA_PATH, parse_options=pa_csv.ParseOptions(newlines_in_values=True))
+    pq.write_table(table, METADATA_PARQUET_PATH, compression='zstd')
 
 # ======================
 # Core Functions
 # ======================
-def download_papers():
+def retry_delay(headers, attempt):
+    """Seconds to wait before retrying, honouring a Retry-After header if present"""
+    retry_after = headers.get('Retry-After', '').strip()
+    if retry_after.isdigit():
+        return int(retry_after)
+    if retry_after:
+        try:
+            return max(0, (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            pass
+    return 2 ** attempt
+
+async def fetch_pdf(session, limiter, url, pdf_path, keep_bytes=False):
+    """Stream a PDF to disk (retrying on 429/5xx), optionally returning its bytes"""
+    # Write to a side file so an interrupted stream never looks like a finished PDF
+    part_path = pdf_path + '.part'
+    for attempt in range(MAX_RETRIES):
+        await limiter.acquire()
+        delay = 2 ** attempt
+        try:
+            async with session.get(url) as resp:
+                if resp.status not in RETRY_STATUSES or attempt == MAX_RETRIES - 1:
+                    resp.raise_for_status()
+                    content = bytearray()
+                    async with aiofiles.open(part_path, 'wb') as f:
+                        async for chunk in resp.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                            await f.write(chunk)
+                            if keep_bytes:
+                                content += chunk
+                    os.replace(part_path, pdf_path)
+                    return bytes(content) if keep_bytes else None
+                delay = retry_delay(resp.headers, attempt)
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError):
+            if attempt == MAX_RETRIES - 1:
+                raise
+        await asyncio.sleep(delay)
+
+def convert_pdf(pdf_bytes, text_path):
+    """Dump the text of an in-memory PDF to text_path and return its word count"""
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        text = "\n".join(page.get_text() for page in doc)
+    with open(text_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return len(text.split())
+
+async def enqueue_results(client, search, queue, num_workers, stop, executor=None, api_limiter=None):
+    """Feed search results to the download workers until exhausted or stopped"""
+    loop = asyncio.get_running_loop()
+    results = client.results(search)
+    count = 0
+    try:
+        while not stop.is_set():
+            # The client requests a new page every page_size results; clients sharing
+            # api_limiter take turns so together they keep to the API rate
+            if api_limiter is not None and count % client.page_size == 0:
+                await api_limiter.acquire()
+            count += 1
+            # The arxiv client pages (and sleeps) synchronously, keep it off the loop
+            result = await loop.run_in_executor(executor, next, results, None)
+            if result is None:
+                break
+            await queue.put(result)
+    except Exception as e:
+        # Keep a failed search from taking the other searches down with it
+        print(f"\n⚠️ Error fetching results for {search.query}: {str(e)}")
+    for _ in range(num_workers):
+        await queue.put(None)
+
+async def download_worker(queue, session, limiter, converter, batch, in_flight, category, target, slots, pbar, stop):
+    loop = asyncio.get_running_loop()
+    while (result := await queue.get()) is not None:
+        if stop.is_set():
+            continue
+
+        paper_id = result.get_short_id()
+        pdf_path = os.path.join(PDF_DIR, f"{paper_id}.pdf")
+        text_path = os.path.join(TEXT_DIR, f"{paper_id}.txt")
+
+        try:
+            # Skip existing entries, and cross-listed papers another category is fetching
+            if paper_id in in_flight or (os.path.exists(pdf_path) and os.path.exists(text_path)):
+                continue
+            in_flight.add(paper_id)
+
+            try:
+                # Claim one of the category's remaining slots so in-flight downloads
+                # can't push it past its target; the slot is returned on failure
+                await slots.acquire()
+                if stop.is_set():
+                    # Pass the wakeup on to the next worker waiting for a slot
+                    slots.release()
+                    continue
+
+                try:
+                    # Download PDF (written to disk as it streams in)
+                    pdf_bytes = await fetch_pdf(session, limiter, result.pdf_url, pdf_path, keep_bytes=True)
+
+                    # Convert to text straight from memory (PyMuPDF isn't thread-safe, so in a process)
+                    word_count = await loop.run_in_executor(converter, convert_pdf, pdf_bytes, text_path)
+                except Exception:
+                    slots.release()
+                    raise
+
+                # Store metadata
+                batch.append([
+                    paper_id,
+                    result.title,
+                    '|'.join(a.name for a in result.authors),
+                    result.published.strftime('%Y-%m-%d'),
+                    category,
+                    pdf_path,
+                    text_path,
+                    word_count,
+                    result.summary,
+                    result.entry_id.split('v')[-1]
+                ])
+                if len(batch) >= METADATA_BATCH_SIZE:
+                    flush_metadata(batch)
+
+                pbar.update(1)
+                if pbar.n >= target:
+                    stop.set()
+                    slots.release()  # Wake the workers still waiting for a slot
+            finally:
+                in_flight.discard(paper_id)
+
+        except Exception as e:
+            print(f"\n⚠️ Error processing {paper_id}: {str(e)}")
+            continue
+
+def build_searches():
+    """Precompute one arXiv search per category"""
+    date_window = f"submittedDate:[{CURRENT_YEAR-5}0101 TO {CURRENT_YEAR}1231]"
+    return [
+        (category, target, arxiv.Search(
+            query=f"cat:{category} AND {date_window}",
+            # Paged lazily until the category hits its target; the cap keeps reruns,
+            # where most results are already on disk, from paging the whole category
+            max_results=target * MAX_RESULTS_FACTOR,
+            sort_by=arxiv.SortCriterion.LastUpdatedDate,
+            sort_order=arxiv.SortOrder.Descending
+        ))
+        for category, target in CATEGORIES.items()
+    ]
+
+async def download_category(pager, api_limiter, converter, session, limiter, batch, in_flight,
+                            category, target, search, position):
+    # One client per category: each pages on its own executor thread, with page
+    # requests across categories paced by the shared api_limiter
     client = arxiv.Client(
         page_size=200,
-        delay_seconds=3.5,
+        delay_seconds=API_RATE_PERIOD,
         num_retries=5
     )
+    queue = asyncio.Queue(maxsize=2 * MAX_CONCURRENCY)
+    stop = asyncio.Event()
+    slots = asyncio.Semaphore(target)
+    with tqdm(total=target, desc=category, position=position) as pbar:
+        await asyncio.gather(
+            enqueue_results(client, search, queue, MAX_CONCURRENCY, stop, pager, api_limiter),
+            *(download_worker(queue, session, limiter, converter, batch, in_flight, category, target, slots, pbar, stop)
+              for _ in range(MAX_CONCURRENCY))
+        )
 
-    with open(METADATA_PATH, 'a', newline='', encoding='utf-8') as meta_file:
-        writer = csv.writer(meta_file)
-        
-        for category, target in CATEGORIES.items():
-            print(f"\n🔍 Processing {category} ({target} papers)")
-            
-            search = arxiv.Search(
-                query=f"cat:{category} AND submittedDate:[{CURRENT_YEAR-5}0101 TO {CURRENT_YEAR}1231]",
-                max_results=int(target * 1.3),
-                sort_by=arxiv.SortCriterion.LastUpdatedDate,
-                sort_order=arxiv.SortOrder.Descending
-            )
-
-            count = 0
-            for result in tqdm(client.results(search), total=target, desc=category):
-                if count >= target:
-                    break
-
-                paper_id = result.get_short_id()
-                pdf_path = os.path.join(PDF_DIR, f"{paper_id}.pdf")
-                text_path = os.path.join(TEXT_DIR, f"{paper_id}.txt")
+async def download_papers():
+    limiter = AsyncLimiter(RATE_LIMIT, RATE_PERIOD)
+    api_limiter = AsyncLimiter(API_RATE_LIMIT, API_RATE_PERIOD)
+    connector = aiohttp.TCPConnector(limit_per_host=MAX_CONCURRENCY)
+    searches = build_searches()
 
-                try:
-                    # Skip existing entries
-                    if os.path.exists(pdf_path) and os.path.exists(text_path):
-                        continue
-
-                    # Download PDF
-                    result.download_pdf(dirpath=PDF_DIR, filename=f"{paper_id}.pdf")
-                    
-                    # Convert to text
-                    doc = fitz.open(pdf_path)
-                    text = "\n".join([page.get_text() for page in doc])
-                    word_count = len(text.split())
-                    with open(text_path, 'w', encoding='utf-8') as f:
-                        f.write(text)
-
-                    # Store metadata
-                    writer.writerow([
-                        paper_id,
-                        result.title,
-                        '|'.join([a.name for a in result.authors]),
-                        result.published.strftime('%Y-%m-%d'),
-                        category,
-                        pdf_path,
-                        text_path,
-                        word_count,
-                        result.summary,
-                        result.entry_id.split('v')[-1]
-                    ])
-
-                    count += 1
-                    time.sleep(1.2)  # Rate limiting
-
-                except Exception as e:
-                    print(f"\n⚠️ Error processing {paper_id}: {str(e)}")
-                    continue
+    batch = []
+    in_flight = set()  # Paper ids being fetched, shared so categories don't race
+
+    try:
+        # All categories run at once, sharing the session's rate limit. Result paging
+        # gets one thread per category; PDF conversion runs in worker processes.
+        with ThreadPoolExecutor(max_workers=len(searches)) as pager, \
+                ProcessPoolExecutor(max_workers=min(os.cpu_count() or 1, 6)) as converter:
+            async with aiohttp.ClientSession(connector=connector) as session:
+                for category, target, _ in searches:
+                    print(f"🔍 Processing {category} ({target} papers)")
+
+                await asyncio.gather(*(
+                    download_category(pager, api_limiter, converter, session, limiter, batch, in_flight,
+                                      category, target, search, i)
+                    for i, (category, target, search) in enumerate(searches)
+                ))
+    finally:
+        # Also runs when Ctrl-C cancels the run, so buffered rows are kept
+        flush_metadata(batch)
 
 # ======================
 # EDA Functions
 # ======================
 def perform_eda():
-    df = pd.read_csv(METADATA_PATH)
+    # Plotting stack is only needed here, keep it out of the download path
+    import pandas as pd
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    
+    # Columnar read skips the long abstracts; fall back to the CSV if Parquet is stale
+    if (os.path.exists(METADATA_PARQUET_PATH)
+            and os.path.getmtime(METADATA_PARQUET_PATH) >= os.path.getmtime(METADATA_PATH)):
+        df = pd.read_parquet(METADATA_PARQUET_PATH, columns=EDA_COLUMNS)
+    else:
+        df = pd.read_csv(METADATA_PATH, usecols=EDA_COLUMNS)
     
     print("\n📊 Basic Statistics:")
     print(df.describe(include='all'))
     
-    # Temporal Analysis
+    # Derived columns, computed once up front
     df['year'] = pd.to_datetime(df['published_date']).dt.year
-    plt.figure(figsize=(12, 6))
-    sns.countplot(x='year', hue='category', data=df)
-    plt.title('Paper Distribution by Year and Category')
-    plt.savefig(os.path.join(EDA_DIR, 'yearly_distribution.png'))
+    df['num_authors'] = df['authors'].str.count(r'\|') + 1
+    
+    fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+    
+    # Temporal Analysis
+    sns.countplot(x='year', hue='category', data=df, ax=axes[0, 0])
+    axes[0, 0].set_title('Paper Distribution by Year and Category')
     
     # Category Distribution
-    plt.figure(figsize=(10, 6))
-    df['category'].value_counts().plot(kind='bar')
-    plt.title('Paper Count by Category')
-    plt.savefig(os.path.join(EDA_DIR, 'category_distribution.png'))
+    df['category'].value_counts().plot(kind='bar', ax=axes[0, 1])
+    axes[0, 1].set_title('Paper Count by Category')
     
     # Word Count Analysis
-    plt.figure(figsize=(10, 6))
-    sns.boxplot(x='category', y='word_count', data=df)
-    plt.title('Word Count Distribution by Category')
-    plt.xticks(rotation=45)
-    plt.savefig(os.path.join(EDA_DIR, 'word_count_distribution.png'))
+    sns.boxplot(x='category', y='word_count', data=df, ax=axes[1, 0])
+    axes[1, 0].set_title('Word Count Distribution by Category')
+    axes[1, 0].tick_params(axis='x', labelrotation=45)
     
     # Author Analysis
-    df['num_authors'] = df['authors'].apply(lambda x: len(x.split('|')))
-    plt.figure(figsize=(10, 6))
-    sns.histplot(df['num_authors'], bins=20)
-    plt.title('Distribution of Number of Authors per Paper')
-    plt.savefig(os.path.join(EDA_DIR, 'author_distribution.png'))
+    sns.histplot(df['num_authors'], bins=20, ax=axes[1, 1])
+    axes[1, 1].set_title('Distribution of Number of Authors per Paper')
+    
+    fig.tight_layout()
+    fig.savefig(os.path.join(EDA_DIR, 'eda_overview.png'))
+    plt.close(fig)
     
     # Save EDA report
     with open(os.path.join(EDA_DIR, 'eda_report.txt'), 'w') as f:
@@ -167,11 +340,12 @@ if __name__ == "__main__":
     init_metadata()
     
     print("🚀 Starting arXiv paper download and processing...")
-    download_papers()
+    asyncio.run(download_papers())
+    export_metadata_parquet()
     
     print("\n🔬 Performing Exploratory Data Analysis...")
     perform_eda()
     
     print(f"\n✅ All done! Results saved to {BASE_DIR}")
     print(f"📈 EDA plots available in {EDA_DIR}")
-    print(f"📄 Metadata file: {METADATA_PATH}")
\ No newline at end of file
+    print(f"📄 Metadata file: {METADATA_PATH} (+ {METADATA_PARQUET_PATH})")
\ No newline at end of file
@@ -1,159 +1,373 @@
 import os
 import re
+import json
+import hashlib
+import functools
 import fitz  # PyMuPDF
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 from tqdm import tqdm
 import arxiv
-from datetime import datetime
-import textstat
+from datetime import datetime, date
+from concurrent.futures import ProcessPoolExecutor
 
 # Configuration
 PDF_DIR = "./all_pdfs"
 TEXT_DIR = "./processed_papers"
 METADATA_PATH = "./paper_metadata.csv"
+METADATA_PARQUET_PATH = "./paper_metadata.parquet"
 EDA_DIR = "./analysis_results"
+META_CACHE_PATH = "./arxiv_meta_cache.json"
+ARXIV_BATCH_SIZE = 100  # Max ids per arXiv API request
 os.makedirs(TEXT_DIR, exist_ok=True)
 os.makedirs(EDA_DIR, exist_ok=True)
 
+# Precompiled patterns (applied per page / per paper)
+_ARXIV_ID_RE = re.compile(r'(\d{4}\.\d{4,5})(v\d+)?\.pdf$')
+_VERSION_RE = re.compile(r'v\d+$')
+_PAGE_NUM_RE = re.compile(r'\s*\n\s*\d+\s*\n\s*')
+_HYPHEN_RE = re.compile(r'-\n(\w+)')
+_EQ_PLACEHOLDER_RE = re.compile(r'\[EQ_\w+_\d+\]')
+_REFERENCES_RE = re.compile(r'(?:[\dIVX]+\.?\s*)?(?:References|Bibliography)', re.IGNORECASE)
+_REFERENCES_HEADING_RE = re.compile(
+    r'^[ \t]*(?:[\dIVX]+\.?[ \t]*)?(?:References|Bibliography)[ \t]*$', re.IGNORECASE | re.MULTILINE
+)
+_EQUATION_RE = re.compile(
+    r'\\begin{equation}(?P<display1>.*?)\\end{equation}'
+    r'|\\\[(?P<display2>.*?)\\\]'
+    r'|\$(?P<inline>.*?)\$',
+    re.DOTALL
+)
+_EQUATION_TYPES = {'display1': 'DISPLAY', 'display2': 'DISPLAY', 'inline': 'INLINE'}
+
 def extract_arxiv_id(filename):
     """Extract arXiv ID from PDF filename using regex"""
-    match = re.search(r'(\d{4}\.\d{4,5})(v\d+)?\.pdf$', filename)
+    match = _ARXIV_ID_RE.search(filename)
     return match.group(1) if match else None
 
 def preserve_equations(text):
     """Identify and replace equations with placeholders"""
-    equation_patterns = [
-        (r'\\begin{equation}(.*?)\\end{equation}', 'DISPLAY', re.DOTALL),
-        (r'\\\[(.*?)\\\]', 'DISPLAY', re.DOTALL),
-        (r'\$(.*?)\$', 'INLINE', re.DOTALL)
-    ]
-    
     equations = []
-    counter = 1
-    
-    for pattern, eq_type, flags in equation_patterns:
-        for match in re.finditer(pattern, text, flags):
-            equation = match.group(1).strip()
-            placeholder = f"[EQ_{eq_type}_{counter}]"
-            text = text.replace(match.group(0), placeholder)
-            equations.append({
-                'placeholder': placeholder,
-                'equation': equation,
-                'type': eq_type,
-                'length': len(equation.split())
-            })
-            counter += 1
+    
+    def replace(match):
+        equation = match.group(match.lastgroup).strip()
+        eq_type = _EQUATION_TYPES[match.lastgroup]
+        placeholder = f"[EQ_{eq_type}_{len(equations) + 1}]"
+        equations.append({
+            'placeholder': placeholder,
+            'equation': equation,
+            'type': eq_type,
+            'length': len(equation.split())
+        })
+        return placeholder
+    
+    text = _EQUATION_RE.sub(replace, text)
     
     return text, equations
 
-def extract_pdf_text(pdf_path):
-    """Extract text from PDF with layout preservation"""
-    doc = fitz.open(pdf_path)
-    full_text = []
+def find_references_page(doc):
+    """Index of the page where the TOC says the references start, if listed"""
+    for _, title, page in doc.get_toc():
+        if page >= 1 and _REFERENCES_RE.fullmatch(title.strip()):
+            return page - 1
+    return None
+
+def extract_pdf_text(pdf_path, text_path):
+    """Extract text from PDF, replace equations and save the processed text to text_path.
+
+    Text stops at the references heading: on the page the TOC lists for References,
+    or without a TOC entry, at the first bare "References"/"Bibliography" line in the
+    second half of the document. A body line there that looks like such a heading
+    (e.g. in an appendix before the bibliography) still cuts the text short.
+    """
+    pages = []
     
-    for page in doc:
-        text = page.get_text("text", flags=fitz.TEXT_PRESERVE_LIGATURES)
-        # Clean common artifacts
-        text = re.sub(r'\s*\n\s*\d+\s*\n\s*', '\n', text)  # Page numbers
-        text = re.sub(r'-\n(\w+)', r'\1', text)  # Hyphenated words
-        full_text.append(text)
+    with fitz.open(pdf_path) as doc:
+        # References add words and regex work but say nothing about readability
+        ref_page = find_references_page(doc)
+        last_page = len(doc) - 1 if ref_page is None else min(ref_page, len(doc) - 1)
+        # Look for the heading only on the TOC's references page or, without a TOC
+        # entry, past the middle of the document, so a contents page listing
+        # "7 References" doesn't end the text early
+        heading_from = max(1, len(doc) // 2 if ref_page is None else last_page)
+        
+        for i in range(last_page + 1):
+            page = doc.load_page(i)
+            text = page.get_text("text", flags=fitz.TEXT_PRESERVE_LIGATURES)
+            # Clean common artifacts
+            text = _PAGE_NUM_RE.sub('\n', text)  # Page numbers
+            text = _HYPHEN_RE.sub(r'\1', text)  # Hyphenated words
+            
+            # Cut at the heading itself, so the text before it on that page is kept
+            ref_match = _REFERENCES_HEADING_RE.search(text) if i >= heading_from else None
+            if ref_match:
+                pages.append(text[:ref_match.start()])
+                break
+            pages.append(text)
     
-    return '\n\n'.join(full_text)
+    # Equations are matched over the whole document so they can span pages
+    processed_text, equations = preserve_equations('\n\n'.join(pages))
+    # Write to a side file so an interrupted run never leaves a truncated text
+    # that the next run would reuse
+    part_path = text_path + '.part'
+    with open(part_path, 'w', encoding='utf-8') as f:
+        f.write(processed_text)
+    os.replace(part_path, text_path)
+    
+    return processed_text, equations
 
-def get_paper_metadata(arxiv_id):
-    """Fetch metadata from arXiv API"""
-    try:
-        result = next(arxiv.Search(id_list=[arxiv_id]).results())
-        return {
-            'title': result.title,
-            'authors': '; '.join([a.name for a in result.authors]),
-            'published_date': result.published.date(),
-            'primary_category': result.primary_category,
-            'categories': ', '.join(result.categories),
-            'doi': result.doi or '',
-            'journal_ref': result.journal_ref or 'arXiv'
-        }
-    except:
-        return None
+def write_json(path, obj):
+    """Dump obj to path via a side file, so a killed run never leaves truncated JSON"""
+    part_path = path + '.part'
+    with open(part_path, 'w', encoding='utf-8') as f:
+        json.dump(obj, f)
+    os.replace(part_path, path)
+
+def fetch_paper_metadata(arxiv_ids):
+    """Fetch metadata from arXiv API in batches, caching results on disk"""
+    cache = {}
+    if os.path.exists(META_CACHE_PATH):
+        try:
+            with open(META_CACHE_PATH, encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError) as e:
+            # Unreadable cache (e.g. left by an older, interrupted run): refetch
+            print(f"\nIgnoring unreadable metadata cache: {str(e)}")
+    
+    client = arxiv.Client(page_size=ARXIV_BATCH_SIZE)
+    missing = sorted(set(arxiv_ids) - cache.keys())
+    for i in range(0, len(missing), ARXIV_BATCH_SIZE):
+        chunk = missing[i:i + ARXIV_BATCH_SIZE]
+        try:
+            search = arxiv.Search(id_list=chunk, max_results=len(chunk))
+            for result in client.results(search):
+                cache[_VERSION_RE.sub('', result.get_short_id())] = {
+                    'title': result.title,
+                    'authors': '; '.join(a.name for a in result.authors),
+                    'published_date': result.published.date().isoformat(),
+                    'primary_category': result.primary_category,
+                    'categories': ', '.join(result.categories),
+                    'doi': result.doi or '',
+                    'journal_ref': result.journal_ref or 'arXiv'
+                }
+        except Exception as e:
+            print(f"\nError fetching metadata batch: {str(e)}")
+    
+    write_json(META_CACHE_PATH, cache)
+    
+    return {
+        arxiv_id: {**cache[arxiv_id], 'published_date': date.fromisoformat(cache[arxiv_id]['published_date'])}
+        for arxiv_id in arxiv_ids if arxiv_id in cache
+    }
+
+def _char_table(predicate):
+    """Lookup table over all Unicode code points for a per-character predicate"""
+    return np.array([predicate(chr(c)) for c in range(0x110000)], dtype=np.bool_)
+
+@functools.cache
+def _token_counter():
+    r"""Compiled count_tokens plus its \w and \s lookup tables, built on first use"""
+    # Numba and the tables cost ~0.4 s, paid only by processes that score text
+    from numba import njit
+    word_chars = _char_table(lambda ch: ch.isalnum() or ch == '_')
+    space_chars = _char_table(str.isspace)
+    return njit(cache=True)(count_tokens), word_chars, space_chars
+
+def count_tokens(codes, word_chars, space_chars):
+    r"""Count words and sentences in an array of code points.
+
+    Equivalent to counting r'\b[\w-]+\b' matches, and the pieces of a split
+    on r'(?<!\b\w\w\.)(?<=[.!?])\s+(?=[A-Z])' that are 10-500 characters long.
+    """
+    n = len(codes)
+    
+    # Words: runs of [\w-] that contain at least one \w character
+    words = 0
+    in_run = False
+    has_word = False
+    for i in range(n):
+        c = codes[i]
+        is_word = word_chars[c]
+        if is_word or c == 45:  # '-'
+            if not in_run:
+                in_run = True
+                has_word = False
+            has_word = has_word or is_word
+        else:
+            if in_run and has_word:
+                words += 1
+            in_run = False
+    if in_run and has_word:
+        words += 1
+    
+    # Sentences: split on whitespace after [.!?] and before [A-Z],
+    # except after a two-letter abbreviation such as "al."
+    sentences = 0
+    seg_start = 0
+    i = 1
+    while i < n:
+        c = codes[i]
+        p = codes[i - 1]
+        if space_chars[c] and (p == 46 or p == 33 or p == 63):
+            j = i
+            while j < n and space_chars[codes[j]]:
+                j += 1
+            abbrev = (
+                p == 46 and i >= 3
+                and word_chars[codes[i - 2]]
+                and word_chars[codes[i - 3]]
+                and (i == 3 or not word_chars[codes[i - 4]])
+            )
+            if not abbrev and j < n and 65 <= codes[j] <= 90:
+                if 10 < i - seg_start < 500:
+                    sentences += 1
+                seg_start = j
+            i = j
+        else:
+            i += 1
+    if 10 < n - seg_start < 500:
+        sentences += 1
+    
+    return words, sentences
 
 def calculate_readability(text):
     """Calculate readability metrics and statistics"""
+    import textstat  # Loads its word lists on import, only pay that when scoring
+    
     # Remove equations for accurate metrics
-    clean_text = re.sub(r'\[EQ_\w+_\d+\]', '', text)
+    clean_text = _EQ_PLACEHOLDER_RE.sub('', text)
+    
+    # Word counts and advanced sentence splitting, in compiled code
+    codes = np.frombuffer(clean_text.encode('utf-32-le'), dtype=np.uint32)
+    counter, word_chars, space_chars = _token_counter()
+    n_words, n_sents = counter(codes, word_chars, space_chars)
+    
+    # Tokenize once for textstat and derive its metrics from shared counts.
+    # Keep contraction apostrophes, as textstat's own word list does.
+    textstat.set_rm_apostrophe(False)
+    tokens = textstat.remove_punctuation(clean_text).split()
+    n_sentences = textstat.sentence_count(clean_text)
+    syllables = {w: textstat.syllable_count(w) for w in set(tokens)}
+    difficult = {w for w in syllables if textstat.is_difficult_word(w, syllable_threshold=3)}
     
-    # Advanced sentence splitting
-    sentences = re.split(r'(?<!\b\w\w\.)(?<=[.!?])\s+(?=[A-Z])', clean_text)
-    sentences = [s.strip() for s in sentences if 10 < len(s) < 500]
+    n_syllables = n_polysyllables = n_difficult = 0
+    for w in tokens:
+        n_syllables += syllables[w]
+        n_polysyllables += syllables[w] >= 3
+        n_difficult += w in difficult
     
-    words = re.findall(r'\b[\w-]+\b', clean_text)
+    words_per_sentence = len(tokens) / n_sentences if n_sentences else 0
+    syllables_per_word = n_syllables / len(tokens) if tokens else 0
     
     return {
-        'word_count': len(words),
-        'sentence_count': len(sentences),
-        'avg_sentence_length': len(words)/len(sentences) if sentences else 0,
-        'flesch_reading_ease': textstat.flesch_reading_ease(clean_text),
-        'gunning_fog': textstat.gunning_fog(clean_text),
-        'smog_index': textstat.smog_index(clean_text)
+        'word_count': n_words,
+        'sentence_count': n_sents,
+        'avg_sentence_length': n_words/n_sents if n_sents else 0,
+        'flesch_reading_ease': (
+            206.835 - 1.015 * words_per_sentence - 84.6 * syllables_per_word
+        ) if words_per_sentence and syllables_per_word else 0.0,
+        'gunning_fog': (
+            0.4 * (words_per_sentence + 100 * n_difficult / len(tokens))
+        ) if tokens else 0.0,
+        'smog_index': (
+            1.043 * (30 * n_polysyllables / n_sentences) ** 0.5 + 3.1291
+        ) if n_sentences else 0.0
     }
 
-def process_pdfs():
-    """Main processing pipeline"""
-    metadata = []
-    
-    for filename in tqdm(os.listdir(PDF_DIR), desc="Processing PDFs"):
-        if not filename.endswith('.pdf'):
-            continue
+def load_cached_metrics(sidecar_path, digest):
+    """Return the readability metrics stored for this text hash, if any"""
+    if not os.path.exists(sidecar_path):
+        return None
+    try:
+        with open(sidecar_path, encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        # Unreadable sidecar (e.g. left by an older, interrupted run): recompute
+        return None
+    return cached['metrics'] if cached.get('sha256') == digest else None
+
+def process_one_pdf(filename):
+    """Extract, clean and score a single PDF (runs in a worker process)"""
+    try:
+        paper_id = os.path.splitext(filename)[0]
+        pdf_path = os.path.join(PDF_DIR, filename)
         
-        try:
-            paper_id = os.path.splitext(filename)[0]
-            pdf_path = os.path.join(PDF_DIR, filename)
-            
-            # Extract and process text
-            raw_text = extract_pdf_text(pdf_path)
-            processed_text, equations = preserve_equations(raw_text)
-            
-            # Save processed text
-            text_path = os.path.join(TEXT_DIR, f"{paper_id}.txt")
-            with open(text_path, 'w', encoding='utf-8') as f:
-                f.write(processed_text)
+        text_path = os.path.join(TEXT_DIR, f"{paper_id}.txt")
+        eq_path = os.path.join(TEXT_DIR, f"{paper_id}_equations.csv")
+        sidecar_path = os.path.join(TEXT_DIR, f"{paper_id}.meta.json")
+        
+        if os.path.exists(text_path) and os.path.getmtime(text_path) > os.path.getmtime(pdf_path):
+            # Text is newer than the PDF, reuse it
+            with open(text_path, encoding='utf-8', newline='') as f:
+                processed_text = f.read()
+            has_equations = os.path.exists(eq_path)
+        else:
+            # Extract, process and save text
+            processed_text, equations = extract_pdf_text(pdf_path, text_path)
             
             # Save equations metadata
-            eq_path = os.path.join(TEXT_DIR, f"{paper_id}_equations.csv")
             if equations:
                 pd.DataFrame(equations).to_csv(eq_path, index=False)
-            
-            # Get metadata
-            arxiv_id = extract_arxiv_id(filename)
-            meta = get_paper_metadata(arxiv_id) if arxiv_id else None
-            
-            # Calculate metrics
+            has_equations = bool(equations)
+        
+        # Calculate metrics, unless the sidecar already has them for this text
+        digest = hashlib.sha256(processed_text.encode('utf-8')).hexdigest()
+        metrics = load_cached_metrics(sidecar_path, digest)
+        if metrics is None:
             metrics = calculate_readability(processed_text)
+            write_json(sidecar_path, {'sha256': digest, 'metrics': metrics})
+        
+        return {
+            'paper_id': paper_id,
+            'arxiv_id': extract_arxiv_id(filename),
+            'text_path': text_path,
+            'equation_path': eq_path if has_equations else None,
+            'metrics': metrics
+        }
+        
+    except Exception as e:
+        print(f"\nError processing {filename}: {str(e)}")
+        return None
+
+def process_pdfs():
+    """Main processing pipeline"""
+    metadata = []
+    filenames = [f for f in os.listdir(PDF_DIR) if f.endswith('.pdf')]
+    arxiv_ids = [i for i in map(extract_arxiv_id, filenames) if i]
+    
+    with ProcessPoolExecutor(max_workers=min(os.cpu_count() or 1, 6)) as executor:
+        records = executor.map(process_one_pdf, filenames, chunksize=4)
+        
+        # Get metadata (network-bound) while the workers extract text
+        paper_meta = fetch_paper_metadata(arxiv_ids)
+        
+        for record in tqdm(records, total=len(filenames), desc="Processing PDFs"):
+            if record is None:
+                continue
+            
+            meta = paper_meta.get(record['arxiv_id'])
+            metrics = record.pop('metrics')
             
             # Build metadata record
             metadata.append({
-                'paper_id': paper_id,
-                'arxiv_id': arxiv_id,
-                'text_path': text_path,
-                'equation_path': eq_path if equations else None,
+                **record,
                 'domain': meta['primary_category'].split('.')[0] if meta else 'Unknown',
                 'year': meta['published_date'].year if meta else datetime.now().year,
                 **metrics,
                 **(meta or {})
             })
-            
-        except Exception as e:
-            print(f"\nError processing {filename}: {str(e)}")
-            continue
     
     # Save metadata
     df = pd.DataFrame(metadata)
     df.to_csv(METADATA_PATH, index=False)
+    df.to_parquet(METADATA_PARQUET_PATH, compression='zstd', index=False)
     return df
 
 def generate_analysis(df):
     """Generate analytical visualizations"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    
     plt.figure(figsize=(18, 6))
     
     # Plot 1: Temporal Distribution
@@ -202,6 +416,7 @@ if __name__ == "__main__":
     Processed Papers: {len(metadata_df)}
     Text Files: {TEXT_DIR}
     Metadata CSV: {METADATA_PATH}
+    Metadata Parquet: {METADATA_PARQUET_PATH}
     Analysis Plots: {EDA_DIR}
     {'='*40}
     """)
\ No newline at end of file
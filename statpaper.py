@@ -1,5 +1,11 @@
 import arxiv
 import os
+import asyncio
+import aiohttp
+from aiolimiter import AsyncLimiter
+from download_pdfs import (
+    fetch_pdf, enqueue_results, MAX_CONCURRENCY, RATE_LIMIT, RATE_PERIOD
+)
 
 # Create a directory to save PDFs
 download_dir = "./statistics_papers"
@@ -23,32 +29,47 @@ search = arxiv.Search(
 success_count = 0
 error_count = 0
 
-try:
-    for result in client.results(search):
+async def download_worker(queue, session, limiter):
+    global success_count, error_count
+
+    while (result := await queue.get()) is not None:
         paper_id = result.entry_id.split("/")[-1].split("v")[0]
         pdf_path = os.path.join(download_dir, f"{paper_id}.pdf")
-        
+
         if os.path.exists(pdf_path):
             print(f"Skipped (exists): {paper_id}.pdf")
             continue
-        
+
         try:
             # Check if PDF URL is available before downloading
             if not result.pdf_url:
                 print(f"Skipped (no PDF): {paper_id}")
                 error_count += 1
                 continue
-            
-            result.download_pdf(dirpath=download_dir, filename=f"{paper_id}.pdf")
+
+            await fetch_pdf(session, limiter, result.pdf_url, pdf_path)
             success_count += 1
             print(f"Downloaded ({success_count}): {paper_id}.pdf")
-        
+
         except Exception as e:
             print(f"Error downloading {paper_id}: {str(e)}")
             error_count += 1
 
+async def main():
+    limiter = AsyncLimiter(RATE_LIMIT, RATE_PERIOD)
+    connector = aiohttp.TCPConnector(limit_per_host=MAX_CONCURRENCY)
+    queue = asyncio.Queue(maxsize=2 * MAX_CONCURRENCY)
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(
+            enqueue_results(client, search, queue, MAX_CONCURRENCY, asyncio.Event()),
+            *(download_worker(queue, session, limiter) for _ in range(MAX_CONCURRENCY))
+        )
+
+try:
+    asyncio.run(main())
 except Exception as e:
     print(f"Fatal error during search: {str(e)}")
 
 print(f"\nDownloaded {success_count} papers | Errors: {error_count}")
-print(f"PDFs saved to: {os.path.abspath(download_dir)}")
\ No newline at end of file
+print(f"PDFs saved to: {os.path.abspath(download_dir)}")